@@ -1,73 +1,388 @@
+import atexit
 import csv
+import functools
+import heapq
+import math
 import os
-from datetime import datetime
-from typing import List, Dict, Optional
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from operator import itemgetter
+from typing import List, Dict, Optional, Tuple
+
+VEHICLE_FIELDS = ['id', 'make', 'model', 'year', 'vin', 'price', 'date', 'notes', 'status', 'bill_of_sale_filename']
+EXPENSE_FIELDS = ['id', 'vehicle_id', 'type', 'amount', 'date', 'description']
+SALE_FIELDS = ['id', 'vehicle_id', 'sale_price', 'sale_date', 'buyer_info', 'sale_notes']
+
+# Fields converted from CSV strings to numbers once, when rows are loaded or added
+VEHICLE_NUMERIC_FIELDS = {'id': int, 'price': float}
+EXPENSE_NUMERIC_FIELDS = {'id': int, 'vehicle_id': int, 'amount': float}
+SALE_NUMERIC_FIELDS = {'id': int, 'vehicle_id': int, 'sale_price': float}
+
+# Maximum age in seconds of cached dashboard stats and reports
+CACHE_MAX_AGE = 60
+
+# Rewrite a CSV file once this share of its rows has been deleted
+TOMBSTONE_COMPACT_RATIO = 0.25
+
+# Buffer size of the long-lived handles used to append rows
+APPEND_BUFFER_SIZE = 1 << 16
+
+def _convert_fields(row: Dict, converters: Dict) -> Dict:
+    """Convert the given fields of a row in place"""
+    for field, convert in converters.items():
+        row[field] = convert(row[field])
+    return row
+
+def _index_search(vehicle: Dict) -> Dict:
+    """Store the lower-cased text matched by inventory search on a vehicle"""
+    vehicle['_search_blob'] = f"{vehicle['make']} {vehicle['model']} {vehicle['year']} {vehicle['vin']}".lower()
+    return vehicle
+
+def _trigrams(text: str) -> set:
+    """Return the set of three-character substrings of a text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _csv_row(row: Dict) -> Dict:
+    """Prepare a row for writing, keeping whole-number floats free of a trailing .0"""
+    return {k: int(v) if isinstance(v, float) and v.is_integer() else v for k, v in row.items()}
+
+def _synchronized(method):
+    """Run a DataManager method while holding its lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class DataManager:
-    """Handles all data operations for the vehicle tracker application"""
+    """Handles all data operations for the vehicle tracker application
+
+    All public methods are synchronized, so one instance can be shared by
+    the threads of a WSGI worker. Other processes writing the same files
+    are picked up through the file modification times.
+    """
 
     def __init__(self):
         self.vehicles_file = 'vehicles.csv'
         self.expenses_file = 'expenses.csv'
         self.sales_file = 'sales.csv'
 
+        # Parsed rows are kept in memory and only re-read when a file is
+        # changed on disk by something other than this manager
+        self._vehicles: List[Dict] = []
+        self._vehicles_by_id: Dict[int, Dict] = {}
+        self._vins: set = set()
+        # Vehicle status -> IDs of the vehicles with that status
+        self._status_buckets: Dict[str, set] = defaultdict(set)
+        # Trigrams of each vehicle's search text -> vehicle IDs containing them
+        self._search_index: Dict[str, set] = defaultdict(set)
+        self._expenses: List[Dict] = []
+        self._expenses_by_vehicle: Dict[int, List[Dict]] = {}
+        # Total of expense amounts per vehicle ID; math.fsum rounds it correctly
+        # and independently of order, though not exactly in decimal
+        self._expense_totals: Dict[int, float] = {}
+        self._sales: List[Dict] = []
+        self._sales_by_id: Dict[int, Dict] = {}
+        self._sales_by_vehicle: Dict[int, List[Dict]] = {}
+        self._mtimes: Dict[str, tuple] = {}
+
+        # Deleted row IDs per CSV file, persisted in a ".deleted" sidecar
+        # file until the CSV is compacted
+        self._tombstones: Dict[str, set] = {}
+
+        # Next free row ID per CSV file, recomputed whenever a file is loaded
+        self._next_ids: Dict[str, int] = {}
+
+        # Append handles are opened once per CSV file and kept open
+        self._appenders: Dict[str, tuple] = {}
+        atexit.register(self.close)
+
+        # Aggregates are cached per data version, which is bumped whenever
+        # any file is loaded or written
+        self._version = 0
+        self._cache: Dict[str, tuple] = {}
+
+        self._lock = threading.RLock()
+
         # Initialize files if they don't exist
         self._initialize_files()
 
     def _initialize_files(self):
-        """Create CSV files with headers if they don't exist"""
-        # Vehicle headers
-        if not os.path.exists(self.vehicles_file):
-            with open(self.vehicles_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'make', 'model', 'year', 'vin', 'price', 'date', 'notes', 'status', 'bill_of_sale_filename'])
-
-        # Expenses headers
-        if not os.path.exists(self.expenses_file):
-            with open(self.expenses_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'vehicle_id', 'type', 'amount', 'date', 'description'])
-
-        # Sales headers
-        if not os.path.exists(self.sales_file):
-            with open(self.sales_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['id', 'vehicle_id', 'sale_price', 'sale_date', 'buyer_info', 'sale_notes'])
-
-    def get_vehicles(self) -> List[Dict]:
-        """Get all vehicles from CSV"""
-        vehicles = []
+        """Create CSV files with headers if they don't exist and load them"""
+        for path, fields in ((self.vehicles_file, VEHICLE_FIELDS),
+                             (self.expenses_file, EXPENSE_FIELDS),
+                             (self.sales_file, SALE_FIELDS)):
+            if not os.path.exists(path):
+                with open(path, 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(fields)
+
+        self._load_vehicles()
+        self._load_expenses()
+        self._load_sales()
+
+    def _get_mtime(self, path: str) -> Optional[int]:
+        """Return the file modification time, or None if it is missing"""
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _get_mtimes(self, path: str) -> tuple:
+        """Return the modification times of a CSV file and its tombstone file"""
+        return self._get_mtime(path), self._get_mtime(self._tombstone_file(path))
+
+    def _is_stale(self, path: str) -> bool:
+        """Check if a file changed on disk since it was last loaded or written"""
+        return self._get_mtimes(path) != self._mtimes.get(path)
+
+    def _bump_version(self):
+        """Invalidate cached aggregates after the data changed"""
+        self._version += 1
+
+    def _refresh_all(self):
+        """Reload any CSV file that changed on disk"""
+        self._refresh_vehicles()
+        self._refresh_expenses()
+        self._refresh_sales()
+
+    @property
+    @_synchronized
+    def version(self) -> int:
+        """Data version, bumped whenever any CSV file is loaded or written"""
+        self._refresh_all()
+        return self._version
+
+    def _cached(self, key: str, compute):
+        """Return a cached aggregate, recomputing it if the data changed or it expired"""
+        self._refresh_all()
+
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry and entry[0] == self._version and now - entry[1] < CACHE_MAX_AGE:
+            return entry[2]
+
+        value = compute()
+        self._cache[key] = (self._version, now, value)
+        return value
+
+    def _get_appender(self, path: str, fields: List[str]) -> tuple:
+        """Return the open append handle and writer for a CSV file"""
+        appender = self._appenders.get(path)
+        if appender is None:
+            f = open(path, 'a', newline='', buffering=APPEND_BUFFER_SIZE)
+            appender = (f, csv.DictWriter(f, fieldnames=fields, extrasaction='ignore'))
+            self._appenders[path] = appender
+        return appender
+
+    def _close_appender(self, path: str):
+        """Close the append handle of a CSV file if it is open"""
+        appender = self._appenders.pop(path, None)
+        if appender:
+            appender[0].close()
+
+    @_synchronized
+    def close(self):
+        """Close all open file handles"""
+        for path in list(self._appenders):
+            self._close_appender(path)
+
+    def _tombstone_file(self, path: str) -> str:
+        """Return the sidecar file holding deleted row IDs for a CSV file"""
+        return os.path.splitext(path)[0] + '.deleted'
+
+    def _read_tombstones(self, path: str) -> set:
+        """Read the deleted row IDs for a CSV file"""
         try:
-            with open(self.vehicles_file, 'r') as f:
+            with open(self._tombstone_file(path), 'r') as f:
+                return {int(line) for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def _read_rows(self, path: str, converters: Dict) -> List[Dict]:
+        """Read all live rows of a CSV file, converting the given numeric fields"""
+        # The file may have been replaced on disk, so reopen it on next append
+        self._close_appender(path)
+
+        rows = []
+        try:
+            with open(path, 'r') as f:
                 reader = csv.DictReader(f)
-                vehicles = list(reader)
-                # Convert id to int for consistency
-                for vehicle in vehicles:
-                    vehicle['id'] = int(vehicle['id'])
+                rows = list(reader)
+                for row in rows:
+                    _convert_fields(row, converters)
         except FileNotFoundError:
             pass
-        return vehicles
 
+        tombstones = self._read_tombstones(path)
+        self._next_ids[path] = max(max((row['id'] for row in rows), default=0),
+                                   max(tombstones, default=0)) + 1
+        if tombstones:
+            rows = [row for row in rows if row['id'] not in tombstones]
+        self._tombstones[path] = tombstones
+
+        self._mtimes[path] = self._get_mtimes(path)
+        self._bump_version()
+        return rows
+
+    def _append_row(self, path: str, fields: List[str], row: Dict):
+        """Append a single row to a CSV file"""
+        f, writer = self._get_appender(path, fields)
+        writer.writerow(_csv_row(row))
+        f.flush()
+        self._mtimes[path] = self._get_mtimes(path)
+        self._bump_version()
+
+    def _write_rows(self, path: str, fields: List[str], rows: List[Dict]):
+        """Rewrite a CSV file with the given rows, dropping any tombstones"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(_csv_row(row) for row in rows)
+
+        if self._tombstones.get(path):
+            self._tombstones[path] = set()
+            try:
+                os.remove(self._tombstone_file(path))
+            except FileNotFoundError:
+                pass
+
+        self._mtimes[path] = self._get_mtimes(path)
+        self._bump_version()
+
+    def _delete_row(self, path: str, fields: List[str], rows: List[Dict], row_id: int):
+        """Record a deleted row, compacting the CSV file once enough rows are deleted
+
+        rows are the remaining live rows, already without the deleted one.
+        """
+        tombstones = self._tombstones.setdefault(path, set())
+        tombstones.add(row_id)
+
+        if len(tombstones) > TOMBSTONE_COMPACT_RATIO * (len(rows) + len(tombstones)):
+            self._write_rows(path, fields, rows)
+            return
+
+        with open(self._tombstone_file(path), 'a') as f:
+            f.write(f"{row_id}\n")
+        self._mtimes[path] = self._get_mtimes(path)
+        self._bump_version()
+
+    def _next_id(self, path: str) -> int:
+        """Generate a new ID that does not collide with live or deleted rows"""
+        row_id = self._next_ids.get(path, 1)
+        self._next_ids[path] = row_id + 1
+        return row_id
+
+    def _load_vehicles(self):
+        """(Re)load vehicles from CSV into memory and rebuild their indexes"""
+        self._vehicles = self._read_rows(self.vehicles_file, VEHICLE_NUMERIC_FIELDS)
+        self._vehicles_by_id = {}
+        self._vins = set()
+        self._status_buckets = defaultdict(set)
+        self._search_index = defaultdict(set)
+        for vehicle in self._vehicles:
+            self._index_vehicle(vehicle)
+
+    def _index_vehicle(self, vehicle: Dict):
+        """Add a vehicle to the ID, VIN and search indexes"""
+        vehicle_id = vehicle['id']
+        self._vehicles_by_id[vehicle_id] = vehicle
+        self._vins.add(vehicle['vin'].upper())
+        self._status_buckets[vehicle['status']].add(vehicle_id)
+        _index_search(vehicle)
+        for trigram in _trigrams(vehicle['_search_blob']):
+            self._search_index[trigram].add(vehicle_id)
+
+    def _unindex_vehicle(self, vehicle: Dict):
+        """Remove a vehicle from the VIN and search indexes"""
+        vehicle_id = vehicle['id']
+        self._vins.discard(vehicle['vin'].upper())
+        self._status_buckets[vehicle['status']].discard(vehicle_id)
+        for trigram in _trigrams(vehicle['_search_blob']):
+            vehicle_ids = self._search_index[trigram]
+            vehicle_ids.discard(vehicle_id)
+            if not vehicle_ids:
+                del self._search_index[trigram]
+
+    def _refresh_vehicles(self):
+        """Reload vehicles if the CSV changed on disk"""
+        if self._is_stale(self.vehicles_file):
+            self._load_vehicles()
+
+    def _group_by_vehicle(self, rows: List[Dict]) -> Dict[int, List[Dict]]:
+        """Index rows by their vehicle_id"""
+        groups = {}
+        for row in rows:
+            groups.setdefault(row['vehicle_id'], []).append(row)
+        return groups
+
+    def _load_expenses(self):
+        """(Re)load expenses from CSV into memory and rebuild their index"""
+        self._expenses = self._read_rows(self.expenses_file, EXPENSE_NUMERIC_FIELDS)
+        self._expenses_by_vehicle = self._group_by_vehicle(self._expenses)
+        self._expense_totals = {vehicle_id: math.fsum(map(itemgetter('amount'), expenses))
+                                for vehicle_id, expenses in self._expenses_by_vehicle.items()}
+
+    def _refresh_expenses(self):
+        """Reload expenses if the CSV changed on disk"""
+        if self._is_stale(self.expenses_file):
+            self._load_expenses()
+
+    def _load_sales(self):
+        """(Re)load sales from CSV into memory and rebuild their index"""
+        self._sales = self._read_rows(self.sales_file, SALE_NUMERIC_FIELDS)
+        self._sales_by_id = {sale['id']: sale for sale in self._sales}
+        self._sales_by_vehicle = self._group_by_vehicle(self._sales)
+
+    def _refresh_sales(self):
+        """Reload sales if the CSV changed on disk"""
+        if self._is_stale(self.sales_file):
+            self._load_sales()
+
+    def _save_vehicles(self):
+        """Write the in-memory vehicles back to CSV"""
+        self._write_rows(self.vehicles_file, VEHICLE_FIELDS, self._vehicles)
+
+    @_synchronized
+    def get_vehicles(self, *, status: Optional[str] = None, search: Optional[str] = None) -> List[Dict]:
+        """Get all vehicles, optionally filtered by status and search text"""
+        self._refresh_vehicles()
+        if search:
+            return self._search_vehicles(search, status)
+        if status:
+            return self._vehicles_with_status(status)
+        return list(self._vehicles)
+
+    def _vehicles_with_status(self, status: str) -> List[Dict]:
+        """Get vehicles with the given status from the status buckets, in ID order"""
+        return [self._vehicles_by_id[vehicle_id] for vehicle_id in sorted(self._status_buckets.get(status, ()))]
+
+    @_synchronized
     def get_vehicle_by_id(self, vehicle_id: int) -> Optional[Dict]:
         """Get a specific vehicle by ID"""
-        vehicles = self.get_vehicles()
-        return next((v for v in vehicles if v['id'] == vehicle_id), None)
+        self._refresh_vehicles()
+        return self._vehicles_by_id.get(vehicle_id)
 
+    @_synchronized
     def add_vehicle(self, vehicle_data: Dict) -> int:
         """Add a new vehicle and return its ID"""
-        vehicles = self.get_vehicles()
+        self._refresh_vehicles()
 
         # Generate new ID
-        vehicle_id = max([v['id'] for v in vehicles], default=0) + 1
+        vehicle_id = self._next_id(self.vehicles_file)
         vehicle_data['id'] = vehicle_id
 
-        # Write to CSV
-        with open(self.vehicles_file, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['id', 'make', 'model', 'year', 'vin', 'price', 'date', 'notes', 'status', 'bill_of_sale_filename'])
-            writer.writerow(vehicle_data)
+        vehicle = {field: vehicle_data.get(field, '') for field in VEHICLE_FIELDS}
+        _convert_fields(vehicle, VEHICLE_NUMERIC_FIELDS)
+        self._vehicles.append(vehicle)
+        self._index_vehicle(vehicle)
+        self._append_row(self.vehicles_file, VEHICLE_FIELDS, vehicle)
 
         return vehicle_id
 
+    @_synchronized
     def delete_vehicle(self, vehicle_id: int) -> bool:
         """Delete a vehicle by ID"""
         vehicles = self.get_vehicles()
@@ -76,156 +391,198 @@ class DataManager:
         if len(updated_vehicles) == len(vehicles):
             return False  # Vehicle not found
 
-        # Rewrite the file
-        with open(self.vehicles_file, 'w', newline='') as f:
-            if updated_vehicles:
-                writer = csv.DictWriter(f, fieldnames=['id', 'make', 'model', 'year', 'vin', 'price', 'date', 'notes', 'status', 'bill_of_sale_filename'])
-                writer.writeheader()
-                writer.writerows(updated_vehicles)
-            else:
-                # Write just headers if no vehicles left
-                writer = csv.writer(f)
-                writer.writerow(['id', 'make', 'model', 'year', 'vin', 'price', 'date', 'notes', 'status', 'bill_of_sale_filename'])
+        self._unindex_vehicle(self._vehicles_by_id.pop(vehicle_id))
+        self._vehicles = updated_vehicles
+        self._delete_row(self.vehicles_file, VEHICLE_FIELDS, self._vehicles, vehicle_id)
 
         return True
 
+    @_synchronized
     def update_vehicle_status(self, vehicle_id: int, status: str) -> bool:
         """Update vehicle status"""
-        vehicles = self.get_vehicles()
-        updated = False
+        vehicle = self.get_vehicle_by_id(vehicle_id)
+        if not vehicle:
+            return False
 
-        for vehicle in vehicles:
-            if vehicle['id'] == vehicle_id:
-                vehicle['status'] = status
-                updated = True
-                break
-
-        if updated:
-            with open(self.vehicles_file, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['id', 'make', 'model', 'year', 'vin', 'price', 'date', 'notes', 'status', 'bill_of_sale_filename'])
-                writer.writeheader()
-                writer.writerows(vehicles)
+        self._status_buckets[vehicle['status']].discard(vehicle_id)
+        vehicle['status'] = status
+        self._status_buckets[status].add(vehicle_id)
+        self._save_vehicles()
 
-        return updated
+        return True
 
+    @_synchronized
     def update_vehicle(self, vehicle_id: int, updated_data: Dict) -> bool:
         """Update a vehicle's information"""
-        vehicles = self.get_vehicles()
-        updated = False
-
-        for vehicle in vehicles:
-            if vehicle['id'] == vehicle_id:
-                # Update all fields
-                vehicle.update(updated_data)
-                updated = True
-                break
+        vehicle = self.get_vehicle_by_id(vehicle_id)
+        if not vehicle:
+            return False
+
+        # Convert a copy first so readers outside the lock never see a
+        # half-updated vehicle with string prices
+        updated = dict(updated_data)
+        _convert_fields(updated, {field: convert for field, convert in VEHICLE_NUMERIC_FIELDS.items()
+                                  if field in updated})
+
+        # Update all fields
+        self._unindex_vehicle(vehicle)
+        vehicle.update(updated)
+        self._index_vehicle(vehicle)
+        self._save_vehicles()
 
-        if updated:
-            with open(self.vehicles_file, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['id', 'make', 'model', 'year', 'vin', 'price', 'date', 'notes', 'status', 'bill_of_sale_filename'])
-                writer.writeheader()
-                writer.writerows(vehicles)
-
-        return updated
+        return True
 
+    def _search_vehicles(self, search: str, status: Optional[str] = None) -> List[Dict]:
+        """Get vehicles whose make, model, year or VIN contain the search text, optionally with a status"""
+        needle = search.lower()
+
+        # Candidates must contain every trigram of the search text (and be in
+        # the status bucket, if given); short queries without trigrams and
+        # without a status fall back to checking every vehicle
+        postings = [self._search_index.get(t, set()) for t in _trigrams(needle)]
+        if status:
+            postings.append(self._status_buckets.get(status, set()))
+        if postings:
+            postings.sort(key=len)
+            candidates = sorted(postings[0].intersection(*postings[1:]))
+            vehicles = [self._vehicles_by_id[vehicle_id] for vehicle_id in candidates]
+        else:
+            vehicles = self._vehicles
+
+        return [v for v in vehicles if needle in v['_search_blob']]
+
+    @_synchronized
     def vin_exists(self, vin: str) -> bool:
         """Check if a VIN already exists"""
-        vehicles = self.get_vehicles()
-        return any(v['vin'].upper() == vin.upper() for v in vehicles)
+        self._refresh_vehicles()
+        return vin.upper() in self._vins
 
+    @_synchronized
     def vehicle_exists(self, vehicle_id: int) -> bool:
         """Check if a vehicle exists"""
         return self.get_vehicle_by_id(vehicle_id) is not None
 
+    @_synchronized
     def get_available_vehicles(self) -> List[Dict]:
         """Get vehicles that are available for sale (In Stock)"""
-        vehicles = self.get_vehicles()
-        return [v for v in vehicles if v['status'] == 'In Stock']
-
-    def get_expenses(self) -> List[Dict]:
-        """Get all expenses from CSV"""
-        expenses = []
-        try:
-            with open(self.expenses_file, 'r') as f:
-                reader = csv.DictReader(f)
-                expenses = list(reader)
-                # Convert IDs to int for consistency
-                for expense in expenses:
-                    expense['id'] = int(expense['id'])
-                    expense['vehicle_id'] = int(expense['vehicle_id'])
-        except FileNotFoundError:
-            pass
-        return expenses
-
+        self._refresh_vehicles()
+        return self._vehicles_with_status('In Stock')
+
+    @_synchronized
+    def get_expenses(self, *, vehicle_id: Optional[int] = None, type_substr: Optional[str] = None) -> List[Dict]:
+        """Get all expenses, optionally filtered by vehicle and part of the expense type"""
+        self._refresh_expenses()
+        if vehicle_id is None:
+            expenses = self._expenses
+        else:
+            expenses = self._expenses_by_vehicle.get(vehicle_id, ())
+        if type_substr:
+            needle = type_substr.lower()
+            return [e for e in expenses if needle in e['type'].lower()]
+        return list(expenses)
+
+    @_synchronized
+    def get_expenses_for_vehicle(self, vehicle_id: int) -> List[Dict]:
+        """Get all expenses of a specific vehicle"""
+        return self.get_expenses(vehicle_id=vehicle_id)
+
+    @_synchronized
     def add_expense(self, expense_data: Dict) -> int:
         """Add a new expense and return its ID"""
-        expenses = self.get_expenses()
+        self._refresh_expenses()
 
         # Generate new ID
-        expense_id = max([e['id'] for e in expenses], default=0) + 1
+        expense_id = self._next_id(self.expenses_file)
         expense_data['id'] = expense_id
 
-        # Write to CSV
-        with open(self.expenses_file, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['id', 'vehicle_id', 'type', 'amount', 'date', 'description'])
-            writer.writerow(expense_data)
+        expense = {field: expense_data.get(field, '') for field in EXPENSE_FIELDS}
+        _convert_fields(expense, EXPENSE_NUMERIC_FIELDS)
+        self._expenses.append(expense)
+        self._expenses_by_vehicle.setdefault(expense['vehicle_id'], []).append(expense)
+        self._expense_totals[expense['vehicle_id']] = math.fsum(
+            map(itemgetter('amount'), self._expenses_by_vehicle[expense['vehicle_id']]))
+        self._append_row(self.expenses_file, EXPENSE_FIELDS, expense)
 
         return expense_id
 
+    @_synchronized
     def delete_expense(self, expense_id: int) -> bool:
         """Delete an expense by ID"""
         expenses = self.get_expenses()
-        updated_expenses = [e for e in expenses if e['id'] != expense_id]
+        deleted_expense = None
+        updated_expenses = []
+
+        for expense in expenses:
+            if expense['id'] == expense_id:
+                deleted_expense = expense
+            else:
+                updated_expenses.append(expense)
 
-        if len(updated_expenses) == len(expenses):
+        if not deleted_expense:
             return False  # Expense not found
 
-        # Rewrite the file
-        with open(self.expenses_file, 'w', newline='') as f:
-            if updated_expenses:
-                writer = csv.DictWriter(f, fieldnames=['id', 'vehicle_id', 'type', 'amount', 'date', 'description'])
-                writer.writeheader()
-                writer.writerows(updated_expenses)
-            else:
-                # Write just headers if no expenses left
-                writer = csv.writer(f)
-                writer.writerow(['id', 'vehicle_id', 'type', 'amount', 'date', 'description'])
+        self._expenses = updated_expenses
+        vehicle_expenses = self._expenses_by_vehicle[deleted_expense['vehicle_id']]
+        vehicle_expenses.remove(deleted_expense)
+        # Re-sum rather than subtract so the total matches a fresh load exactly
+        if vehicle_expenses:
+            self._expense_totals[deleted_expense['vehicle_id']] = math.fsum(map(itemgetter('amount'), vehicle_expenses))
+        else:
+            del self._expense_totals[deleted_expense['vehicle_id']]
+        self._delete_row(self.expenses_file, EXPENSE_FIELDS, self._expenses, expense_id)
 
         return True
 
+    @_synchronized
     def get_sales(self) -> List[Dict]:
-        """Get all sales from CSV"""
-        sales = []
-        try:
-            with open(self.sales_file, 'r') as f:
-                reader = csv.DictReader(f)
-                sales = list(reader)
-                # Convert IDs to int for consistency
-                for sale in sales:
-                    sale['id'] = int(sale['id'])
-                    sale['vehicle_id'] = int(sale['vehicle_id'])
-        except FileNotFoundError:
-            pass
-        return sales
-
+        """Get all sales"""
+        self._refresh_sales()
+        return list(self._sales)
+
+    @_synchronized
+    def get_sale_by_id(self, sale_id: int) -> Optional[Dict]:
+        """Get a specific sale by ID"""
+        self._refresh_sales()
+        return self._sales_by_id.get(sale_id)
+
+    @_synchronized
+    def get_sale_details(self, sale_id: int) -> Optional[Tuple[Dict, Optional[Dict], List[Dict]]]:
+        """Get (sale, vehicle, vehicle expenses) for a sale, or None if the sale doesn't exist"""
+        self._refresh_all()
+        sale = self._sales_by_id.get(sale_id)
+        if sale is None:
+            return None
+        vehicle_id = sale['vehicle_id']
+        return sale, self._vehicles_by_id.get(vehicle_id), list(self._expenses_by_vehicle.get(vehicle_id, ()))
+
+    @_synchronized
+    def get_sales_for_vehicle(self, vehicle_id: int) -> List[Dict]:
+        """Get all sales of a specific vehicle"""
+        self._refresh_sales()
+        return list(self._sales_by_vehicle.get(vehicle_id, ()))
+
+    @_synchronized
     def add_sale(self, sale_data: Dict) -> int:
         """Add a new sale and update vehicle status"""
-        sales = self.get_sales()
+        self._refresh_sales()
 
         # Generate new ID
-        sale_id = max([s['id'] for s in sales], default=0) + 1
+        sale_id = self._next_id(self.sales_file)
         sale_data['id'] = sale_id
 
-        # Write to CSV
-        with open(self.sales_file, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['id', 'vehicle_id', 'sale_price', 'sale_date', 'buyer_info', 'sale_notes'])
-            writer.writerow(sale_data)
+        sale = {field: sale_data.get(field, '') for field in SALE_FIELDS}
+        _convert_fields(sale, SALE_NUMERIC_FIELDS)
+        self._sales.append(sale)
+        self._sales_by_id[sale_id] = sale
+        self._sales_by_vehicle.setdefault(sale['vehicle_id'], []).append(sale)
+        self._append_row(self.sales_file, SALE_FIELDS, sale)
 
         # Update vehicle status to Sold
-        self.update_vehicle_status(int(sale_data['vehicle_id']), 'Sold')
+        self.update_vehicle_status(sale['vehicle_id'], 'Sold')
 
         return sale_id
 
+    @_synchronized
     def delete_sale(self, sale_id: int) -> bool:
         """Delete a sale and restore vehicle to inventory"""
         sales = self.get_sales()
@@ -241,43 +598,75 @@ class DataManager:
         if not deleted_sale:
             return False  # Sale not found
 
-        # Rewrite the file
-        with open(self.sales_file, 'w', newline='') as f:
-            if updated_sales:
-                writer = csv.DictWriter(f, fieldnames=['id', 'vehicle_id', 'sale_price', 'sale_date', 'buyer_info', 'sale_notes'])
-                writer.writeheader()
-                writer.writerows(updated_sales)
-            else:
-                # Write just headers if no sales left
-                writer = csv.writer(f)
-                writer.writerow(['id', 'vehicle_id', 'sale_price', 'sale_date', 'buyer_info', 'sale_notes'])
+        self._sales = updated_sales
+        del self._sales_by_id[sale_id]
+        self._sales_by_vehicle[deleted_sale['vehicle_id']].remove(deleted_sale)
+        self._delete_row(self.sales_file, SALE_FIELDS, self._sales, sale_id)
 
         # Restore vehicle to In Stock status
         self.update_vehicle_status(deleted_sale['vehicle_id'], 'In Stock')
 
         return True
 
+    @_synchronized
+    def get_expense_totals(self) -> Dict[int, float]:
+        """Get the total expense amount per vehicle ID"""
+        self._refresh_expenses()
+        return dict(self._expense_totals)
+
+    @_synchronized
+    def get_sale_summaries(self) -> List[Tuple[Dict, Dict, float, float]]:
+        """Get (sale, vehicle, expense total, profit) for each sale with a known vehicle"""
+        return self._cached('sale_summaries', self._compute_sale_summaries)
+
+    def _compute_sale_summaries(self) -> List[Tuple[Dict, Dict, float, float]]:
+        """Join sales with their vehicles and expense totals in one pass"""
+        expense_totals = self._expense_totals
+        vehicles_by_id = self._vehicles_by_id
+        summaries = []
+        for sale in self._sales:
+            vehicle = vehicles_by_id.get(sale['vehicle_id'])
+            if vehicle:
+                expense_total = expense_totals.get(sale['vehicle_id'], 0)
+                profit = sale['sale_price'] - vehicle['price'] - expense_total
+                summaries.append((sale, vehicle, expense_total, profit))
+        return summaries
+
+    @_synchronized
     def get_dashboard_stats(self) -> Dict:
+        """Get dashboard statistics, cached until the data changes"""
+        return self._cached('dashboard_stats', self._compute_dashboard_stats)
+
+    def _compute_dashboard_stats(self) -> Dict:
         """Generate dashboard statistics"""
         vehicles = self.get_vehicles()
         expenses = self.get_expenses()
         sales = self.get_sales()
 
-        # Calculate statistics
+        # Calculate vehicle statistics in a single pass
         total_vehicles = len(vehicles)
-        in_stock_vehicles = len([v for v in vehicles if v['status'] == 'In Stock'])
-        sold_vehicles = len([v for v in vehicles if v['status'] == 'Sold'])
-
-        total_inventory_value = sum(float(v['price']) for v in vehicles if v['status'] == 'In Stock')
-        total_expenses = sum(float(e['amount']) for e in expenses)
-        total_sales_revenue = sum(float(s['sale_price']) for s in sales)
-
-        # Calculate profit (sales revenue - purchase cost of sold vehicles - expenses)
+        in_stock_vehicles = 0
+        sold_vehicles = 0
+        total_inventory_value = 0
+        for vehicle in vehicles:
+            status = vehicle['status']
+            if status == 'In Stock':
+                in_stock_vehicles += 1
+                total_inventory_value += vehicle['price']
+            elif status == 'Sold':
+                sold_vehicles += 1
+
+        total_expenses = math.fsum(map(itemgetter('amount'), expenses))
+
+        # Calculate revenue and purchase cost of sold vehicles in a single pass
+        get_vehicle = self._vehicles_by_id.get
+        total_sales_revenue = 0
         sold_vehicle_costs = 0
         for sale in sales:
-            vehicle = self.get_vehicle_by_id(sale['vehicle_id'])
+            total_sales_revenue += sale['sale_price']
+            vehicle = get_vehicle(sale['vehicle_id'])
             if vehicle:
-                sold_vehicle_costs += float(vehicle['price'])
+                sold_vehicle_costs += vehicle['price']
 
         gross_profit = total_sales_revenue - sold_vehicle_costs
         net_profit = gross_profit - total_expenses
@@ -293,71 +682,72 @@ class DataManager:
             'net_profit': net_profit
         }
 
+    @_synchronized
     def generate_reports(self) -> Dict:
+        """Get comprehensive reports, cached until the data changes"""
+        return self._cached('reports', self._compute_reports)
+
+    def _compute_reports(self) -> Dict:
         """Generate comprehensive reports"""
         vehicles = self.get_vehicles()
         expenses = self.get_expenses()
         sales = self.get_sales()
 
         # Vehicle summary by make
-        make_summary = {}
+        make_summary = defaultdict(lambda: {'total': 0, 'in_stock': 0, 'sold': 0})
         for vehicle in vehicles:
-            make = vehicle['make']
-            if make not in make_summary:
-                make_summary[make] = {'total': 0, 'in_stock': 0, 'sold': 0}
-            make_summary[make]['total'] += 1
+            summary = make_summary[vehicle['make']]
+            summary['total'] += 1
             if vehicle['status'] == 'In Stock':
-                make_summary[make]['in_stock'] += 1
+                summary['in_stock'] += 1
             elif vehicle['status'] == 'Sold':
-                make_summary[make]['sold'] += 1
+                summary['sold'] += 1
 
         # Expense summary by type
-        expense_summary = {}
+        expense_summary = defaultdict(lambda: {'count': 0, 'total_amount': 0})
         for expense in expenses:
-            exp_type = expense['type']
-            if exp_type not in expense_summary:
-                expense_summary[exp_type] = {'count': 0, 'total_amount': 0}
-            expense_summary[exp_type]['count'] += 1
-            expense_summary[exp_type]['total_amount'] += float(expense['amount'])
+            summary = expense_summary[expense['type']]
+            summary['count'] += 1
+            summary['total_amount'] += expense['amount']
 
         # Sales summary by month
-        sales_by_month = {}
+        sales_by_month = defaultdict(lambda: {'count': 0, 'revenue': 0})
         for sale in sales:
             try:
                 # Parse date and get year-month
-                sale_date = datetime.strptime(sale['sale_date'], '%Y-%m-%d')
-                month_key = sale_date.strftime('%Y-%m')
-                if month_key not in sales_by_month:
-                    sales_by_month[month_key] = {'count': 0, 'revenue': 0}
-                sales_by_month[month_key]['count'] += 1
-                sales_by_month[month_key]['revenue'] += float(sale['sale_price'])
+                sale_date = date.fromisoformat(sale['sale_date'])
             except ValueError:
                 continue  # Skip invalid dates
-
-        # Most profitable vehicles (vehicles with expenses and sales)
-        vehicle_profits = []
+            summary = sales_by_month[f"{sale_date.year:04d}-{sale_date.month:02d}"]
+            summary['count'] += 1
+            summary['revenue'] += sale['sale_price']
+
+        # Most profitable vehicles (vehicles with expenses and sales).
+        # Profits are computed first so report rows are only built for the top 10.
+        profits = []
+        get_vehicle = self._vehicles_by_id.get
         for sale in sales:
-            vehicle = self.get_vehicle_by_id(sale['vehicle_id'])
+            vehicle = get_vehicle(sale['vehicle_id'])
             if vehicle:
-                vehicle_expenses = [e for e in expenses if e['vehicle_id'] == sale['vehicle_id']]
-                total_expenses = sum(float(e['amount']) for e in vehicle_expenses)
-                profit = float(sale['sale_price']) - float(vehicle['price']) - total_expenses
-
-                vehicle_profits.append({
-                    'vehicle': f"{vehicle['make']} {vehicle['model']} {vehicle['year']}",
-                    'purchase_price': float(vehicle['price']),
-                    'sale_price': float(sale['sale_price']),
-                    'expenses': total_expenses,
-                    'profit': profit,
-                    'sale_date': sale['sale_date']
-                })
-
-        # Sort by profit descending
-        vehicle_profits.sort(key=lambda x: x['profit'], reverse=True)
+                total_expenses = self._expense_totals.get(sale['vehicle_id'], 0)
+                profit = sale['sale_price'] - vehicle['price'] - total_expenses
+                profits.append((profit, total_expenses, sale, vehicle))
+
+        # Top 10 by profit descending
+        top_profits = heapq.nlargest(10, profits, key=itemgetter(0))
+
+        vehicle_profits = [{
+            'vehicle': f"{vehicle['make']} {vehicle['model']} {vehicle['year']}",
+            'purchase_price': vehicle['price'],
+            'sale_price': sale['sale_price'],
+            'expenses': total_expenses,
+            'profit': profit,
+            'sale_date': sale['sale_date']
+        } for profit, total_expenses, sale, vehicle in top_profits]
 
         return {
-            'make_summary': make_summary,
-            'expense_summary': expense_summary,
-            'sales_by_month': sales_by_month,
-            'vehicle_profits': vehicle_profits[:10]  # Top 10 most profitable
+            'make_summary': dict(make_summary),
+            'expense_summary': dict(expense_summary),
+            'sales_by_month': dict(sales_by_month),
+            'vehicle_profits': vehicle_profits
         }
\ No newline at end of file
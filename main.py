@@ -1,10 +1,22 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
-from datetime import datetime
-from data_manager import DataManager
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session, Response, stream_with_context, make_response
+from datetime import datetime, date
+from data_manager import DataManager, VEHICLE_FIELDS, CACHE_MAX_AGE
 import os
+import re
+import math
+import csv
 import logging
+import time
+import functools
+import threading
+from collections import Counter, OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from werkzeug.utils import secure_filename
 import mimetypes
+import unicodedata
+from urllib.parse import quote
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -12,6 +24,12 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 import io
 
+# orjson is optional; without it dump_json() falls back to Flask's app.json.dumps
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
@@ -20,32 +38,329 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "vehicle-tracker-secret-key")
 
 # File upload configuration
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png'}
-
-def allowed_file(filename):
-    """Check if uploaded file has an allowed extension"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+MAX_UPLOAD_SIZE = 16 * 1024 * 1024  # 16MB max file size
+UPLOAD_CHUNK_SIZE = 64 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
+_EXT_MIME = {'pdf': 'application/pdf', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+# Shared PDF styles; reportlab only reads these while building documents
+_PDF_STYLES = getSampleStyleSheet()
+_SALES_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_PDF_STYLES['Heading1'],
+    fontSize=20,
+    spaceAfter=30,
+    alignment=1  # Center alignment
+)
+_SALES_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (0, 1), (0, -2), 'LEFT'),  # Vehicle names left aligned
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+])
+_SALES_COL_WIDTHS = (2.5*inch, 1*inch, 1*inch, 1*inch, 1*inch)
+_BILL_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_PDF_STYLES['Heading1'],
+    fontSize=18,
+    spaceAfter=30,
+    alignment=1  # Center alignment
+)
+# Label/value tables for the vehicle and sale sections of a bill of sale
+_DETAIL_COL_WIDTHS = (1.5*inch, 4*inch)
+_DETAIL_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+_EXPENSE_HEADER = ('Date', 'Type', 'Description', 'Amount')
+_EXPENSE_COL_WIDTHS = (1*inch, 1.5*inch, 2.5*inch, 1*inch)
+_EXPENSE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (2, 1), (2, -2), 'LEFT'),  # Description column left aligned
+    ('ALIGN', (3, 0), (3, -1), 'RIGHT'), # Amount column right aligned
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BACKGROUND', (-2, -1), (-1, -1), colors.lightgrey),
+    ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
+])
+_FINANCIAL_COL_WIDTHS = (2*inch, 1.5*inch)
+_FINANCIAL_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('LINEBELOW', (-2, -1), (-1, -1), 2, colors.black),
+    ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
+])
+
+# PDF rendering is CPU-bound, so it runs on a small worker pool and finished
+# documents are kept per cache key (which includes the data version)
+PDF_WORKERS = 2
+PDF_CACHE_SIZE = 8
+_pdf_executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix='pdf')
+_pdf_futures = OrderedDict()
+_pdf_lock = threading.Lock()
+
+def render_pdf(key, build):
+    """Return PDF bytes for key, building them on the PDF pool once per key"""
+    with _pdf_lock:
+        future = _pdf_futures.get(key)
+        if future is None:
+            future = _pdf_executor.submit(build)
+            _pdf_futures[key] = future
+            if len(_pdf_futures) > PDF_CACHE_SIZE:
+                _pdf_futures.popitem(last=False)
+        else:
+            _pdf_futures.move_to_end(key)
 
-def validate_file_content(file_data, filename):
+    try:
+        return future.result()
+    except Exception:
+        # Don't cache failures; the next request retries the build
+        with _pdf_lock:
+            if _pdf_futures.get(key) is future:
+                del _pdf_futures[key]
+        raise
+
+# Report columns fetched from a record in one call
+_VEHICLE_COLUMNS = itemgetter('id', 'make', 'model', 'year', 'vin', 'status', 'price', 'date')
+_EXPENSE_COLUMNS = itemgetter('id', 'date', 'type', 'amount', 'description')
+
+# Rows per chunk sent to the client by stream_csv()
+CSV_STREAM_BATCH = 1024
+
+def csv_field(value):
+    """Quote a text field the way csv.writer's default dialect would"""
+    if ',' in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def set_attachment(response, filename):
+    """Set an attachment Content-Disposition, with a UTF-8 filename* for non-ASCII names as send_file does"""
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(filename, safe="!#$&+-.^_`|~")
+        response.headers.set('Content-Disposition', 'attachment', filename=simple,
+                             **{'filename*': f"UTF-8''{quoted}"})
+    else:
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    return response
+
+def _csv_response(chunks, filename):
+    """Stream text chunks as a CSV attachment"""
+    return set_attachment(Response(stream_with_context(chunks), mimetype='text/csv'), filename)
+
+def stream_csv(rows, filename):
+    """Stream rows as a CSV attachment in batches of lines"""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        rows_iter = iter(rows)
+        while batch := list(islice(rows_iter, CSV_STREAM_BATCH)):
+            writer.writerows(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    return _csv_response(generate(), filename)
+
+def stream_csv_lines(lines, filename):
+    """Stream preformatted CSV lines as an attachment in batches"""
+    def generate():
+        lines_iter = iter(lines)
+        while batch := ''.join(islice(lines_iter, CSV_STREAM_BATCH)):
+            yield batch
+
+    return _csv_response(generate(), filename)
+
+def pdf_response(pdf, filename):
+    """Send rendered PDF bytes as an attachment without copying them into a file object"""
+    return set_attachment(Response(pdf, mimetype='application/pdf'), filename)
+
+def read_upload(file, limit=MAX_UPLOAD_SIZE):
+    """Read an uploaded file in chunks, returning None as soon as it exceeds the size limit"""
+    chunks = []
+    size = 0
+    while chunk := file.stream.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+def classify_upload(filename):
+    """Return the expected MIME type for an allowed upload, or None if the extension is not allowed"""
+    _, dot, ext = filename.rpartition('.')
+    return _EXT_MIME.get(ext.lower()) if dot else None
+
+def validate_file_content(file_data, filename, expected=None):
     """Validate file content matches its extension"""
     try:
+        expected = expected or classify_upload(filename)
         mime_type, _ = mimetypes.guess_type(filename)
-        if mime_type:
-            if filename.lower().endswith(('.jpg', '.jpeg')) and not mime_type.startswith('image/'):
-                return False
-            elif filename.lower().endswith('.png') and mime_type != 'image/png':
-                return False
-            elif filename.lower().endswith('.pdf') and mime_type != 'application/pdf':
-                return False
-        return True
+        if expected is None or mime_type is None:
+            return True
+        if expected == 'image/jpeg':
+            return mime_type.startswith('image/')
+        return mime_type == expected
     except:
         return False
 
+# ASCII-only patterns: str.isdigit() also accepts characters like '²' that float() rejects
+_PRICE_MATCH = re.compile(r'\d+\.?\d*|\.\d+', re.ASCII).fullmatch
+_YEAR_MATCH = re.compile(r'\d{4}', re.ASCII).fullmatch
+_ID_MATCH = re.compile(r'\d+', re.ASCII).fullmatch
+
+# Last formatted timestamp per strftime format, as (epoch second, text)
+_now_cache = {}
+
+def format_now(fmt):
+    """Format the current local time, reusing the result within the same second"""
+    second = int(time.time())
+    cached = _now_cache.get(fmt)
+    if cached and cached[0] == second:
+        return cached[1]
+    text = datetime.now().strftime(fmt)
+    _now_cache[fmt] = (second, text)
+    return text
+
+def format_money(value):
+    """Format an amount as dollars with thousands separators, e.g. $1,234.50"""
+    return f"${value:,.2f}"
+
+def parse_price(value):
+    """Parse a non-negative decimal amount, returning None if it is invalid"""
+    value = value.strip()
+    if not _PRICE_MATCH(value):
+        return None
+    return float(value)
+
+def parse_year(value):
+    """Parse a vehicle model year, returning None if it is invalid or out of range"""
+    value = value.strip()
+    if not _YEAR_MATCH(value):
+        return None
+    year = int(value)
+    if year < 1900 or year > datetime.now().year + 1:
+        return None
+    return year
+
+def parse_id(value):
+    """Parse a record ID from form input, returning None if it is invalid"""
+    value = value.strip()
+    if not _ID_MATCH(value):
+        return None
+    return int(value)
+
+# Form specs: (required fields, (field, parser, error message) checks)
+VEHICLE_FORM = (
+    ('make', 'model', 'year', 'vin', 'price'),
+    (('price', parse_price, 'Please enter a valid price'),
+     ('year', parse_year, 'Please enter a valid year')),
+)
+EXPENSE_FORM = (
+    ('vehicle_id', 'type', 'amount'),
+    (('amount', parse_price, 'Please enter a valid amount'),),
+)
+SALE_FORM = (
+    ('vehicle_id', 'sale_price', 'sale_date'),
+    (('sale_price', parse_price, 'Please enter a valid sale price'),),
+)
+
+def validate_form(data, spec):
+    """Return the first validation error for submitted form data, or None if it is valid"""
+    required, checks = spec
+    if not all(data[field] for field in required):
+        return 'Please fill in all required fields'
+    for field, parse, message in checks:
+        if parse(data[field]) is None:
+            return message
+    return None
+
+def parse_sale_date(value):
+    """Parse an ISO or MM/DD/YYYY sale date, returning date.min if it is invalid"""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, '%m/%d/%Y').date()
+    except ValueError:
+        return date.min
+
+def dump_json(obj):
+    """Serialize obj to JSON bytes, with orjson when it is available"""
+    if orjson is None:
+        # Keep field order like orjson does; NaN still comes out as NaN here
+        # where orjson writes null
+        return app.json.dumps(obj, sort_keys=False).encode('utf-8')
+    return orjson.dumps(obj)
+
+# Serialized vehicle API payloads as vehicle ID -> (data version, JSON bytes)
+_vehicle_json_cache = {}
+
 # Initialize data manager
 data_manager = DataManager()
 
+# Rendered HTML per endpoint as (data version, render time, html)
+_page_cache = {}
+
+def cached_page(view):
+    """Reuse a page's rendered HTML until the data changes or it expires"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # Flashed messages are rendered into the page, so never cache those
+        if '_flashes' in session:
+            return view(*args, **kwargs)
+
+        version = data_manager.version
+        now = time.monotonic()
+        entry = _page_cache.get(request.endpoint)
+        if entry and entry[0] == version and now - entry[1] < CACHE_MAX_AGE:
+            return entry[2]
+
+        html = view(*args, **kwargs)
+        _page_cache[request.endpoint] = (version, now, html)
+        return html
+    return wrapper
+
+# Distinguishes ETags issued by this process, since data versions restart at zero
+_ETAG_PREFIX = f"{os.getpid()}-{int(time.time())}"
+
+def etag_by_version(view):
+    """Answer conditional GETs with 304 until the data version or the day changes"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = f"{_ETAG_PREFIX}-{data_manager.version}-{date.today().isoformat()}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
 @app.route('/')
+@cached_page
 def index():
     """Dashboard/home page with summary statistics"""
     stats = data_manager.get_dashboard_stats()
@@ -54,16 +369,10 @@ def index():
 @app.route('/inventory')
 def inventory():
     """Vehicle inventory page"""
-    vehicles = data_manager.get_vehicles()
     search = request.args.get('search', '')
     status_filter = request.args.get('status', '')
 
-    # Apply filters
-    if search:
-        vehicles = [v for v in vehicles if search.lower() in f"{v['make']} {v['model']} {v['year']} {v['vin']}".lower()]
-
-    if status_filter:
-        vehicles = [v for v in vehicles if v['status'] == status_filter]
+    vehicles = data_manager.get_vehicles(status=status_filter, search=search)
 
     return render_template('inventory.html', vehicles=vehicles, search=search, status_filter=status_filter)
 
@@ -82,27 +391,9 @@ def add_vehicle():
             'status': 'In Stock'
         }
 
-        # Validate required fields
-        required_fields = ['make', 'model', 'year', 'vin', 'price']
-        if not all(vehicle_data[field] for field in required_fields):
-            flash('Please fill in all required fields', 'error')
-            return redirect(url_for('inventory'))
-
-        # Validate price is numeric
-        try:
-            float(vehicle_data['price'])
-        except ValueError:
-            flash('Please enter a valid price', 'error')
-            return redirect(url_for('inventory'))
-
-        # Validate year is numeric and reasonable
-        try:
-            year = int(vehicle_data['year'])
-            if year < 1900 or year > datetime.now().year + 1:
-                flash('Please enter a valid year', 'error')
-                return redirect(url_for('inventory'))
-        except ValueError:
-            flash('Please enter a valid year', 'error')
+        # Validate required fields, price and year
+        if error := validate_form(vehicle_data, VEHICLE_FORM):
+            flash(error, 'error')
             return redirect(url_for('inventory'))
 
         # Check if VIN already exists
@@ -116,15 +407,16 @@ def add_vehicle():
         # Handle bill of sale upload if provided
         if 'bill_of_sale' in request.files:
             file = request.files['bill_of_sale']
-            if file and file.filename and allowed_file(file.filename):
+            upload_mime = classify_upload(file.filename) if file and file.filename else None
+            if upload_mime:
                 try:
                     filename = secure_filename(file.filename)
-                    file_data = file.read()
+                    file_data = read_upload(file)
 
                     # Validate file size (additional check)
-                    if len(file_data) > 16 * 1024 * 1024:  # 16MB
+                    if file_data is None:
                         flash('File too large. Maximum size is 16MB.', 'warning')
-                    elif validate_file_content(file_data, filename):
+                    elif validate_file_content(file_data, filename, upload_mime):
                         if data_manager.upload_bill_of_sale(vehicle_id, file_data, filename):
                             flash(f'Vehicle added successfully with ID {vehicle_id} and bill of sale uploaded', 'success')
                         else:
@@ -168,27 +460,9 @@ def edit_vehicle(vehicle_id):
                 'status': request.form.get('status', vehicle['status'])
             }
 
-            # Validate required fields
-            required_fields = ['make', 'model', 'year', 'vin', 'price']
-            if not all(updated_data[field] for field in required_fields):
-                flash('Please fill in all required fields', 'error')
-                return redirect(url_for('edit_vehicle', vehicle_id=vehicle_id))
-
-            # Validate price is numeric
-            try:
-                float(updated_data['price'])
-            except ValueError:
-                flash('Please enter a valid price', 'error')
-                return redirect(url_for('edit_vehicle', vehicle_id=vehicle_id))
-
-            # Validate year is numeric and reasonable
-            try:
-                year = int(updated_data['year'])
-                if year < 1900 or year > datetime.now().year + 1:
-                    flash('Please enter a valid year', 'error')
-                    return redirect(url_for('edit_vehicle', vehicle_id=vehicle_id))
-            except ValueError:
-                flash('Please enter a valid year', 'error')
+            # Validate required fields, price and year
+            if error := validate_form(updated_data, VEHICLE_FORM):
+                flash(error, 'error')
                 return redirect(url_for('edit_vehicle', vehicle_id=vehicle_id))
 
             # Check if VIN already exists (excluding current vehicle)
@@ -202,15 +476,16 @@ def edit_vehicle(vehicle_id):
                 # Handle bill of sale upload if provided
                 if 'bill_of_sale' in request.files:
                     file = request.files['bill_of_sale']
-                    if file and file.filename and allowed_file(file.filename):
+                    upload_mime = classify_upload(file.filename) if file and file.filename else None
+                    if upload_mime:
                         try:
                             filename = secure_filename(file.filename)
-                            file_data = file.read()
+                            file_data = read_upload(file)
 
                             # Validate file size
-                            if len(file_data) > 16 * 1024 * 1024:  # 16MB
+                            if file_data is None:
                                 flash('Vehicle updated, but bill of sale file too large (max 16MB)', 'warning')
-                            elif validate_file_content(file_data, filename):
+                            elif validate_file_content(file_data, filename, upload_mime):
                                 # Delete old bill of sale if exists
                                 data_manager.delete_bill_of_sale(vehicle_id)
 
@@ -245,11 +520,8 @@ def delete_vehicle(vehicle_id):
     """Delete a vehicle from inventory with cascade deletion"""
     try:
         # First, delete all associated expenses and sales
-        expenses = data_manager.get_expenses()
-        sales = data_manager.get_sales()
-
-        vehicle_expenses = [e for e in expenses if e['vehicle_id'] == vehicle_id]
-        vehicle_sales = [s for s in sales if s['vehicle_id'] == vehicle_id]
+        vehicle_expenses = data_manager.get_expenses_for_vehicle(vehicle_id)
+        vehicle_sales = data_manager.get_sales_for_vehicle(vehicle_id)
 
         deleted_items = []
 
@@ -280,19 +552,18 @@ def delete_vehicle(vehicle_id):
 @app.route('/expenses')
 def expenses():
     """Vehicle expenses page"""
-    expenses = data_manager.get_expenses()
     vehicles = data_manager.get_vehicles()
 
     # Filter options
     vehicle_filter = request.args.get('vehicle', '')
     type_filter = request.args.get('type', '')
 
-    # Apply filters
-    if vehicle_filter:
-        expenses = [e for e in expenses if str(e['vehicle_id']) == vehicle_filter]
-
-    if type_filter:
-        expenses = [e for e in expenses if type_filter.lower() in e['type'].lower()]
+    # A vehicle filter that isn't a valid ID matches no expenses
+    vehicle_id = parse_id(vehicle_filter) if vehicle_filter else None
+    if vehicle_filter and vehicle_id is None:
+        expenses = []
+    else:
+        expenses = data_manager.get_expenses(vehicle_id=vehicle_id, type_substr=type_filter)
 
     return render_template('expenses.html', expenses=expenses, vehicles=vehicles, 
                          vehicle_filter=vehicle_filter, type_filter=type_filter)
@@ -309,20 +580,14 @@ def add_expense():
             'description': request.form.get('description', '').strip()
         }
 
-        # Validate required fields
-        if not all([expense_data['vehicle_id'], expense_data['type'], expense_data['amount']]):
-            flash('Please fill in all required fields', 'error')
-            return redirect(url_for('expenses'))
-
-        # Validate amount is numeric
-        try:
-            float(expense_data['amount'])
-        except ValueError:
-            flash('Please enter a valid amount', 'error')
+        # Validate required fields and amount
+        if error := validate_form(expense_data, EXPENSE_FORM):
+            flash(error, 'error')
             return redirect(url_for('expenses'))
 
         # Validate vehicle exists
-        if not data_manager.vehicle_exists(int(expense_data['vehicle_id'])):
+        expense_data['vehicle_id'] = parse_id(expense_data['vehicle_id'])
+        if expense_data['vehicle_id'] is None or not data_manager.vehicle_exists(expense_data['vehicle_id']):
             flash('Selected vehicle does not exist', 'error')
             return redirect(url_for('expenses'))
 
@@ -370,21 +635,14 @@ def add_sale():
             'sale_notes': request.form.get('sale_notes', '').strip()
         }
 
-        # Validate required fields
-        if not all([sale_data['vehicle_id'], sale_data['sale_price'], sale_data['sale_date']]):
-            flash('Please fill in all required fields', 'error')
-            return redirect(url_for('sales'))
-
-        # Validate sale price is numeric
-        try:
-            float(sale_data['sale_price'])
-        except ValueError:
-            flash('Please enter a valid sale price', 'error')
+        # Validate required fields and sale price
+        if error := validate_form(sale_data, SALE_FORM):
+            flash(error, 'error')
             return redirect(url_for('sales'))
 
         # Validate vehicle exists and is available
-        vehicle_id = int(sale_data['vehicle_id'])
-        vehicle = data_manager.get_vehicle_by_id(vehicle_id)
+        sale_data['vehicle_id'] = parse_id(sale_data['vehicle_id'])
+        vehicle = data_manager.get_vehicle_by_id(sale_data['vehicle_id']) if sale_data['vehicle_id'] is not None else None
         if not vehicle:
             flash('Selected vehicle does not exist', 'error')
             return redirect(url_for('sales'))
@@ -417,6 +675,7 @@ def delete_sale(sale_id):
     return redirect(url_for('sales'))
 
 @app.route('/reports')
+@cached_page
 def reports():
     """Reports and analytics page"""
     reports_data = data_manager.generate_reports()
@@ -427,36 +686,24 @@ def downloads():
     """Downloads page for vehicle reports"""
     try:
         sold_vehicles_data = []
-        sales = data_manager.get_sales()
-        vehicles = data_manager.get_vehicles()
-        expenses = data_manager.get_expenses()
-
-        for sale in sales:
-            vehicle = data_manager.get_vehicle_by_id(sale['vehicle_id'])
-            if vehicle:
-                # Get expenses for this vehicle
-                vehicle_expenses = [e for e in expenses if e['vehicle_id'] == sale['vehicle_id']]
-                total_expenses = sum(float(e['amount']) for e in vehicle_expenses)
-
-                # Calculate profit
-                purchase_price = float(vehicle['price'])
-                sale_price = float(sale['sale_price'])
-                net_profit = sale_price - purchase_price - total_expenses
-
-                sold_vehicles_data.append({
-                    'sale_id': sale['id'],
-                    'vehicle': vehicle,
-                    'purchase_price': purchase_price,
-                    'sale_price': sale_price,
-                    'sale_date': sale['sale_date'],
-                    'buyer_info': sale['buyer_info'],
-                    'total_expenses': total_expenses,
-                    'net_profit': net_profit,
-                    'expense_count': len(vehicle_expenses)
-                })
+        expense_counts = Counter(e['vehicle_id'] for e in data_manager.get_expenses())
+
+        for sale, vehicle, total_expenses, net_profit in data_manager.get_sale_summaries():
+            sold_vehicles_data.append({
+                'sale_id': sale['id'],
+                'vehicle': vehicle,
+                'purchase_price': vehicle['price'],
+                'sale_price': sale['sale_price'],
+                'sale_date': sale['sale_date'],
+                '_sale_dt': parse_sale_date(sale['sale_date']),
+                'buyer_info': sale['buyer_info'],
+                'total_expenses': total_expenses,
+                'net_profit': net_profit,
+                'expense_count': expense_counts[sale['vehicle_id']]
+            })
 
         # Sort by sale date (newest first)
-        sold_vehicles_data.sort(key=lambda x: x['sale_date'], reverse=True)
+        sold_vehicles_data.sort(key=itemgetter('_sale_dt'), reverse=True)
 
         return render_template('downloads.html', sold_vehicles=sold_vehicles_data)
 
@@ -474,104 +721,131 @@ def download_vehicle_report(sale_id):
 def download_vehicle_csv(sale_id):
     """Download CSV data for a specific vehicle sale"""
     try:
-        import csv
+        # Get sale, vehicle and expense details in one lookup
+        details = data_manager.get_sale_details(sale_id)
 
-        # Get sale details
-        sales = data_manager.get_sales()
-        sale = next((s for s in sales if s['id'] == sale_id), None)
-
-        if not sale:
+        if not details:
             flash('Sale not found', 'error')
             return redirect(url_for('downloads'))
 
-        # Get vehicle details
-        vehicle = data_manager.get_vehicle_by_id(sale['vehicle_id'])
+        sale, vehicle, vehicle_expenses = details
         if not vehicle:
             flash('Vehicle not found', 'error')
             return redirect(url_for('downloads'))
 
-        # Get expenses for this vehicle
-        expenses = data_manager.get_expenses()
-        vehicle_expenses = [e for e in expenses if e['vehicle_id'] == sale['vehicle_id']]
-
-        # Create CSV in memory
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-
-        # Vehicle Information
-        writer.writerow(['VEHICLE INFORMATION'])
-        writer.writerow(['Field', 'Value'])
-        writer.writerow(['Vehicle ID', vehicle['id']])
-        writer.writerow(['Make', vehicle['make']])
-        writer.writerow(['Model', vehicle['model']])
-        writer.writerow(['Year', vehicle['year']])
-        writer.writerow(['VIN', vehicle['vin']])
-        writer.writerow(['Purchase Price', f"${float(vehicle['price']):,.2f}"])
-        writer.writerow(['Purchase Date', vehicle['date']])
-        writer.writerow(['Notes', vehicle['notes']])
-        writer.writerow([])
-
-        # Sale Information
-        writer.writerow(['SALE INFORMATION'])
-        writer.writerow(['Field', 'Value'])
-        writer.writerow(['Sale ID', sale['id']])
-        writer.writerow(['Sale Price', f"${float(sale['sale_price']):,.2f}"])
-        writer.writerow(['Sale Date', sale['sale_date']])
-        writer.writerow(['Buyer Info', sale['buyer_info']])
-        writer.writerow(['Sale Notes', sale['sale_notes']])
-        writer.writerow([])
-
-        # Expenses
-        if vehicle_expenses:
-            writer.writerow(['VEHICLE EXPENSES'])
-            writer.writerow(['Expense ID', 'Date', 'Type', 'Amount', 'Description'])
-            total_expenses = 0
-            for expense in vehicle_expenses:
-                writer.writerow([
-                    expense['id'],
-                    expense['date'],
-                    expense['type'],
-                    f"${float(expense['amount']):,.2f}",
-                    expense['description']
-                ])
-                total_expenses += float(expense['amount'])
-            writer.writerow(['', '', 'TOTAL EXPENSES', f"${total_expenses:,.2f}", ''])
-            writer.writerow([])
-
-        # Financial Summary
-        writer.writerow(['FINANCIAL SUMMARY'])
-        writer.writerow(['Item', 'Amount'])
-        purchase_price = float(vehicle['price'])
-        sale_price = float(sale['sale_price'])
-        total_expenses = sum(float(e['amount']) for e in vehicle_expenses)
-        gross_profit = sale_price - purchase_price
-        net_profit = gross_profit - total_expenses
-
-        writer.writerow(['Purchase Price', f"${purchase_price:,.2f}"])
-        writer.writerow(['Sale Price', f"${sale_price:,.2f}"])
-        writer.writerow(['Gross Profit', f"${gross_profit:,.2f}"])
-        writer.writerow(['Total Expenses', f"${total_expenses:,.2f}"])
-        writer.writerow(['Net Profit', f"${net_profit:,.2f}"])
-
-        # Return CSV
-        output = buffer.getvalue()
-        buffer.close()
+        # Each amount is formatted once and reused across sections
+        purchase_price = vehicle['price']
+        sale_price = sale['sale_price']
+        total_expenses = math.fsum(map(itemgetter('amount'), vehicle_expenses))
+        purchase_price_s = format_money(purchase_price)
+        sale_price_s = format_money(sale_price)
+        total_expenses_s = format_money(total_expenses)
+
+        def rows():
+            # Vehicle Information
+            yield ['VEHICLE INFORMATION']
+            yield ['Field', 'Value']
+            yield ['Vehicle ID', vehicle['id']]
+            yield ['Make', vehicle['make']]
+            yield ['Model', vehicle['model']]
+            yield ['Year', vehicle['year']]
+            yield ['VIN', vehicle['vin']]
+            yield ['Purchase Price', purchase_price_s]
+            yield ['Purchase Date', vehicle['date']]
+            yield ['Notes', vehicle['notes']]
+            yield []
+
+            # Sale Information
+            yield ['SALE INFORMATION']
+            yield ['Field', 'Value']
+            yield ['Sale ID', sale['id']]
+            yield ['Sale Price', sale_price_s]
+            yield ['Sale Date', sale['sale_date']]
+            yield ['Buyer Info', sale['buyer_info']]
+            yield ['Sale Notes', sale['sale_notes']]
+            yield []
+
+            # Expenses
+            if vehicle_expenses:
+                yield ['VEHICLE EXPENSES']
+                yield ['Expense ID', 'Date', 'Type', 'Amount', 'Description']
+                for expense_id, expense_date, expense_type, amount, description in map(_EXPENSE_COLUMNS, vehicle_expenses):
+                    yield [expense_id, expense_date, expense_type, format_money(amount), description]
+                yield ['', '', 'TOTAL EXPENSES', total_expenses_s, '']
+                yield []
+
+            # Financial Summary
+            yield ['FINANCIAL SUMMARY']
+            yield ['Item', 'Amount']
+            gross_profit = sale_price - purchase_price
+            net_profit = gross_profit - total_expenses
+
+            yield ['Purchase Price', purchase_price_s]
+            yield ['Sale Price', sale_price_s]
+            yield ['Gross Profit', format_money(gross_profit)]
+            yield ['Total Expenses', total_expenses_s]
+            yield ['Net Profit', format_money(net_profit)]
 
         filename = f"vehicle_report_{vehicle['make']}_{vehicle['model']}_{vehicle['year']}_sale_{sale_id}.csv"
-
-        return send_file(
-            io.BytesIO(output.encode('utf-8')),
-            as_attachment=True,
-            download_name=filename,
-            mimetype='text/csv'
-        )
+        return stream_csv(rows(), filename)
 
     except Exception as e:
         logging.error(f"Error generating vehicle CSV: {e}")
         flash('An error occurred while generating the CSV file', 'error')
         return redirect(url_for('downloads'))
 
+def build_all_sales_pdf():
+    """Render the all-sales PDF report and return its bytes"""
+    # Create PDF in memory
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+
+    # Build PDF content
+    story = []
+
+    # Title
+    story.append(Paragraph("ALL VEHICLE SALES REPORT", _SALES_TITLE_STYLE))
+    story.append(Paragraph(f"Generated on {format_now('%B %d, %Y')}", _PDF_STYLES['Normal']))
+    story.append(Spacer(1, 30))
+
+    # Sales Summary Table
+    sales_data = [['Vehicle', 'Purchase Price', 'Sale Price', 'Sale Date', 'Profit/Loss']]
+
+    total_purchase = 0
+    total_sale = 0
+    total_expenses = 0
+
+    for sale, vehicle, expense_total, profit in data_manager.get_sale_summaries():
+        purchase_price = vehicle['price']
+        sale_price = sale['sale_price']
+
+        total_purchase += purchase_price
+        total_sale += sale_price
+        total_expenses += expense_total
+
+        sales_data.append([
+            f"{vehicle['make']} {vehicle['model']} {vehicle['year']}",
+            format_money(purchase_price),
+            format_money(sale_price),
+            sale['sale_date'],
+            format_money(profit)
+        ])
+
+    # Add totals row
+    total_profit = total_sale - total_purchase - total_expenses
+    sales_data.append(['TOTALS', format_money(total_purchase), format_money(total_sale), '', format_money(total_profit)])
+
+    sales_table = Table(sales_data, colWidths=_SALES_COL_WIDTHS)
+    sales_table.setStyle(_SALES_TABLE_STYLE)
+
+    story.append(sales_table)
+
+    # Build PDF
+    doc.build(story)
+    return buffer.getvalue()
+
 @app.route('/download/all_sales_pdf')
+@etag_by_version
 def download_all_sales_pdf():
     """Download PDF report for all sales"""
     try:
@@ -580,92 +854,13 @@ def download_all_sales_pdf():
             flash('No sales data available for download', 'error')
             return redirect(url_for('downloads'))
 
-        # Create PDF in memory
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
-
-        # Build PDF content
-        story = []
-
-        # Title
-        story.append(Paragraph("ALL VEHICLE SALES REPORT", title_style))
-        story.append(Paragraph(f"Generated on {datetime.now().strftime('%B %d, %Y')}", styles['Normal']))
-        story.append(Spacer(1, 30))
-
-        # Sales Summary Table
-        sales_data = [['Vehicle', 'Purchase Price', 'Sale Price', 'Sale Date', 'Profit/Loss']]
-
-        total_purchase = 0
-        total_sale = 0
-        total_expenses = 0
-
-        expenses = data_manager.get_expenses()
-
-        for sale in sales:
-            vehicle = data_manager.get_vehicle_by_id(sale['vehicle_id'])
-            if vehicle:
-                vehicle_expenses = [e for e in expenses if e['vehicle_id'] == sale['vehicle_id']]
-                expense_total = sum(float(e['amount']) for e in vehicle_expenses)
-
-                purchase_price = float(vehicle['price'])
-                sale_price = float(sale['sale_price'])
-                profit = sale_price - purchase_price - expense_total
-
-                total_purchase += purchase_price
-                total_sale += sale_price
-                total_expenses += expense_total
-
-                sales_data.append([
-                    f"{vehicle['make']} {vehicle['model']} {vehicle['year']}",
-                    f"${purchase_price:,.2f}",
-                    f"${sale_price:,.2f}",
-                    sale['sale_date'],
-                    f"${profit:,.2f}"
-                ])
-
-        # Add totals row
-        total_profit = total_sale - total_purchase - total_expenses
-        sales_data.append(['TOTALS', f"${total_purchase:,.2f}", f"${total_sale:,.2f}", '', f"${total_profit:,.2f}"])
-
-        sales_table = Table(sales_data, colWidths=[2.5*inch, 1*inch, 1*inch, 1*inch, 1*inch])
-        sales_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('ALIGN', (0, 1), (0, -2), 'LEFT'),  # Vehicle names left aligned
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ]))
-
-        story.append(sales_table)
-
-        # Build PDF
-        doc.build(story)
+        # The report embeds today's date, so it is cached per day as well
+        pdf = render_pdf(('all_sales', data_manager.version, date.today()), build_all_sales_pdf)
 
         # Return PDF
-        buffer.seek(0)
-        filename = f"all_sales_report_{datetime.now().strftime('%Y%m%d')}.pdf"
+        filename = f"all_sales_report_{format_now('%Y%m%d')}.pdf"
 
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/pdf'
-        )
+        return pdf_response(pdf, filename)
 
     except Exception as e:
         logging.error(f"Error generating all sales PDF: {e}")
@@ -673,68 +868,45 @@ def download_all_sales_pdf():
         return redirect(url_for('downloads'))
 
 @app.route('/download/all_sales_csv')
+@etag_by_version
 def download_all_sales_csv():
     """Download CSV of all sales data"""
     try:
-        import csv
-
         sales = data_manager.get_sales()
-        vehicles = data_manager.get_vehicles()
-        expenses = data_manager.get_expenses()
 
         if not sales:
             flash('No sales data available for download', 'error')
             return redirect(url_for('downloads'))
 
-        # Create CSV in memory
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
+        summaries = data_manager.get_sale_summaries()
 
-        # Headers
-        writer.writerow([
-            'Sale ID', 'Vehicle ID', 'Make', 'Model', 'Year', 'VIN',
-            'Purchase Price', 'Sale Price', 'Sale Date', 'Buyer Info',
-            'Total Expenses', 'Net Profit', 'Sale Notes'
-        ])
+        def rows():
+            # Headers
+            yield [
+                'Sale ID', 'Vehicle ID', 'Make', 'Model', 'Year', 'VIN',
+                'Purchase Price', 'Sale Price', 'Sale Date', 'Buyer Info',
+                'Total Expenses', 'Net Profit', 'Sale Notes'
+            ]
 
-        for sale in sales:
-            vehicle = data_manager.get_vehicle_by_id(sale['vehicle_id'])
-            if vehicle:
-                vehicle_expenses = [e for e in expenses if e['vehicle_id'] == vehicle['id']]
-                total_expenses = sum(float(e['amount']) for e in vehicle_expenses)
-
-                purchase_price = float(vehicle['price'])
-                sale_price = float(sale['sale_price'])
-                net_profit = sale_price - purchase_price - total_expenses
-
-                writer.writerow([
+            for sale, vehicle, total_expenses, net_profit in summaries:
+                yield [
                     sale['id'],
                     vehicle['id'],
                     vehicle['make'],
                     vehicle['model'],
                     vehicle['year'],
                     vehicle['vin'],
-                    f"{purchase_price:.2f}",
-                    f"{sale_price:.2f}",
+                    f"{vehicle['price']:.2f}",
+                    f"{sale['sale_price']:.2f}",
                     sale['sale_date'],
                     sale['buyer_info'],
                     f"{total_expenses:.2f}",
                     f"{net_profit:.2f}",
                     sale['sale_notes']
-                ])
-
-        # Return CSV
-        output = buffer.getvalue()
-        buffer.close()
+                ]
 
-        filename = f"all_sales_data_{datetime.now().strftime('%Y%m%d')}.csv"
-
-        return send_file(
-            io.BytesIO(output.encode('utf-8')),
-            as_attachment=True,
-            download_name=filename,
-            mimetype='text/csv'
-        )
+        filename = f"all_sales_data_{format_now('%Y%m%d')}.csv"
+        return stream_csv(rows(), filename)
 
     except Exception as e:
         logging.error(f"Error generating all sales CSV: {e}")
@@ -745,237 +917,178 @@ def download_all_sales_csv():
 def download_inventory_summary():
     """Download inventory summary CSV"""
     try:
-        import csv
-
         vehicles = data_manager.get_vehicles()
-        expenses = data_manager.get_expenses()
-        sales = data_manager.get_sales()
-
-        # Create CSV in memory
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-
-        # Headers
-        writer.writerow([
-            'Vehicle ID', 'Make', 'Model', 'Year', 'VIN', 'Status',
-            'Purchase Price', 'Purchase Date', 'Total Expenses',
-            'Sale Price', 'Sale Date', 'Net Profit'
-        ])
+        expense_totals = data_manager.get_expense_totals()
+
+        # First sale of each vehicle
+        sales_by_vehicle = {}
+        for sale in data_manager.get_sales():
+            sales_by_vehicle.setdefault(sale['vehicle_id'], sale)
+
+        # Lines are formatted by hand: numbers and IDs never need quoting,
+        # so only the free-text columns go through csv_field()
+        def lines():
+            # Headers
+            yield ('Vehicle ID,Make,Model,Year,VIN,Status,Purchase Price,Purchase Date,'
+                   'Total Expenses,Sale Price,Sale Date,Net Profit\r\n')
+
+            for vehicle in vehicles:
+                vehicle_id, make, model, year, vin, status, price, purchase_date = _VEHICLE_COLUMNS(vehicle)
+                total_expenses = expense_totals.get(vehicle_id, 0)
+
+                # Sale columns are left blank for unsold vehicles
+                vehicle_sale = sales_by_vehicle.get(vehicle_id)
+                if vehicle_sale:
+                    sale_price = vehicle_sale['sale_price']
+                    net_profit = sale_price - price - total_expenses
+                    sale_columns = f"{sale_price:.2f},{csv_field(vehicle_sale['sale_date'])},{net_profit:.2f}"
+                else:
+                    sale_columns = ',,'
 
-        for vehicle in vehicles:
-            vehicle_expenses = [e for e in expenses if e['vehicle_id'] == vehicle['id']]
-            total_expenses = sum(float(e['amount']) for e in vehicle_expenses)
-
-            # Find sale if exists
-            vehicle_sale = next((s for s in sales if s['vehicle_id'] == vehicle['id']), None)
-
-            sale_price = float(vehicle_sale['sale_price']) if vehicle_sale else 0
-            sale_date = vehicle_sale['sale_date'] if vehicle_sale else ''
-            net_profit = sale_price - float(vehicle['price']) - total_expenses if vehicle_sale else 0
-
-            writer.writerow([
-                vehicle['id'],
-                vehicle['make'],
-                vehicle['model'],
-                vehicle['year'],
-                vehicle['vin'],
-                vehicle['status'],
-                f"{float(vehicle['price']):.2f}",
-                vehicle['date'],
-                f"{total_expenses:.2f}",
-                f"{sale_price:.2f}" if vehicle_sale else '',
-                sale_date,
-                f"{net_profit:.2f}" if vehicle_sale else ''
-            ])
-
-        # Return CSV
-        output = buffer.getvalue()
-        buffer.close()
-
-        filename = f"inventory_summary_{datetime.now().strftime('%Y%m%d')}.csv"
+                yield (f"{vehicle_id},{csv_field(make)},{csv_field(model)},{csv_field(year)},"
+                       f"{csv_field(vin)},{csv_field(status)},{price:.2f},{csv_field(purchase_date)},"
+                       f"{total_expenses:.2f},{sale_columns}\r\n")
 
-        return send_file(
-            io.BytesIO(output.encode('utf-8')),
-            as_attachment=True,
-            download_name=filename,
-            mimetype='text/csv'
-        )
+        filename = f"inventory_summary_{format_now('%Y%m%d')}.csv"
+        return stream_csv_lines(lines(), filename)
 
     except Exception as e:
         logging.error(f"Error generating inventory summary: {e}")
         flash('An error occurred while generating the inventory summary', 'error')
         return redirect(url_for('downloads'))
 
+def build_bill_of_sale_pdf(vehicle, sale, vehicle_expenses, generated_at):
+    """Render a bill of sale PDF and return its bytes"""
+    # Each amount is formatted once and reused across sections
+    purchase_price = vehicle['price']
+    sale_price = sale['sale_price']
+    total_expenses = math.fsum(map(itemgetter('amount'), vehicle_expenses))
+    purchase_price_s = format_money(purchase_price)
+    sale_price_s = format_money(sale_price)
+    total_expenses_s = format_money(total_expenses)
+
+    # Create PDF in memory
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+
+    styles = _PDF_STYLES
+
+    # Build PDF content. One spacer instance is reused between sections;
+    # it can't be shared across documents because reportlab attaches the
+    # frame and canvas to a flowable while placing it.
+    story = []
+    section_gap = Spacer(1, 20)
+
+    # Title
+    story.append(Paragraph("BILL OF SALE", _BILL_TITLE_STYLE))
+    story.append(section_gap)
+
+    # Vehicle Information
+    story.append(Paragraph("<b>VEHICLE INFORMATION</b>", styles['Heading2']))
+    vehicle_data = [
+        ['Make:', vehicle['make']],
+        ['Model:', vehicle['model']],
+        ['Year:', vehicle['year']],
+        ['VIN:', vehicle['vin']],
+        ['Purchase Price:', purchase_price_s],
+        ['Status:', vehicle['status']]
+    ]
+
+    vehicle_table = Table(vehicle_data, colWidths=_DETAIL_COL_WIDTHS)
+    vehicle_table.setStyle(_DETAIL_TABLE_STYLE)
+    story.append(vehicle_table)
+    story.append(section_gap)
+
+    # Sale Information
+    story.append(Paragraph("<b>SALE INFORMATION</b>", styles['Heading2']))
+    sale_data = [
+        ['Sale ID:', str(sale['id'])],
+        ['Sale Price:', sale_price_s],
+        ['Sale Date:', sale['sale_date']],
+        ['Buyer Info:', sale['buyer_info'] or 'Not provided'],
+    ]
+
+    sale_table = Table(sale_data, colWidths=_DETAIL_COL_WIDTHS)
+    sale_table.setStyle(_DETAIL_TABLE_STYLE)
+    story.append(sale_table)
+    story.append(section_gap)
+
+    # Sale Notes if available
+    if sale.get('sale_notes'):
+        story.append(Paragraph("<b>SALE NOTES</b>", styles['Heading2']))
+        story.append(Paragraph(sale['sale_notes'], styles['Normal']))
+        story.append(section_gap)
+
+    # Vehicle Expenses
+    if vehicle_expenses:
+        story.append(Paragraph("<b>VEHICLE EXPENSES</b>", styles['Heading2']))
+
+        expense_data = [_EXPENSE_HEADER]
+        expense_data.extend([
+            (expense_date, expense_type, description or 'N/A', format_money(amount))
+            for _, expense_date, expense_type, amount, description in map(_EXPENSE_COLUMNS, vehicle_expenses)
+        ])
+
+        # Add total row
+        expense_data.append(['', '', 'TOTAL EXPENSES:', total_expenses_s])
+
+        expense_table = Table(expense_data, colWidths=_EXPENSE_COL_WIDTHS)
+        expense_table.setStyle(_EXPENSE_TABLE_STYLE)
+        story.append(expense_table)
+        story.append(section_gap)
+
+    # Financial Summary
+    story.append(Paragraph("<b>FINANCIAL SUMMARY</b>", styles['Heading2']))
+    gross_profit = sale_price - purchase_price
+    net_profit = gross_profit - total_expenses
+
+    financial_data = [
+        ['Purchase Price:', purchase_price_s],
+        ['Sale Price:', sale_price_s],
+        ['Gross Profit:', format_money(gross_profit)],
+        ['Total Expenses:', total_expenses_s],
+        ['Net Profit:', format_money(net_profit)]
+    ]
+
+    financial_table = Table(financial_data, colWidths=_FINANCIAL_COL_WIDTHS)
+    financial_table.setStyle(_FINANCIAL_TABLE_STYLE)
+    story.append(financial_table)
+    story.append(Spacer(1, 30))
+
+    # Footer
+    story.append(Paragraph(f"Generated on {generated_at}", styles['Normal']))
+
+    # Build PDF
+    doc.build(story)
+    return buffer.getvalue()
+
 @app.route('/bill_of_sale/<int:sale_id>')
 def generate_bill_of_sale(sale_id):
     """Generate and download bill of sale PDF for a sold vehicle"""
     try:
-        # Get sale details
-        sales = data_manager.get_sales()
-        sale = next((s for s in sales if s['id'] == sale_id), None)
+        # Get sale, vehicle and expense details in one lookup
+        details = data_manager.get_sale_details(sale_id)
 
-        if not sale:
+        if not details:
             flash('Sale not found', 'error')
             return redirect(url_for('sales'))
 
-        # Get vehicle details
-        vehicle = data_manager.get_vehicle_by_id(sale['vehicle_id'])
+        sale, vehicle, vehicle_expenses = details
         if not vehicle:
             flash('Vehicle not found', 'error')
             return redirect(url_for('sales'))
 
-        # Get expenses for this vehicle
-        expenses = data_manager.get_expenses()
-        vehicle_expenses = [e for e in expenses if e['vehicle_id'] == sale['vehicle_id']]
-
-        # Create PDF in memory
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1  # Center alignment
+        # The footer shows the time to the minute, which is part of the cache key
+        generated_at = format_now('%B %d, %Y at %I:%M %p')
+        pdf = render_pdf(
+            ('bill_of_sale', sale_id, data_manager.version, generated_at),
+            functools.partial(build_bill_of_sale_pdf, vehicle, sale, vehicle_expenses, generated_at)
         )
 
-        # Build PDF content
-        story = []
-
-        # Title
-        story.append(Paragraph("BILL OF SALE", title_style))
-        story.append(Spacer(1, 20))
-
-        # Vehicle Information
-        story.append(Paragraph("<b>VEHICLE INFORMATION</b>", styles['Heading2']))
-        vehicle_data = [
-            ['Make:', vehicle['make']],
-            ['Model:', vehicle['model']],
-            ['Year:', vehicle['year']],
-            ['VIN:', vehicle['vin']],
-            ['Purchase Price:', f"${float(vehicle['price']):,.2f}"],
-            ['Status:', vehicle['status']]
-        ]
-
-        vehicle_table = Table(vehicle_data, colWidths=[1.5*inch, 4*inch])
-        vehicle_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        story.append(vehicle_table)
-        story.append(Spacer(1, 20))
-
-        # Sale Information
-        story.append(Paragraph("<b>SALE INFORMATION</b>", styles['Heading2']))
-        sale_data = [
-            ['Sale ID:', str(sale['id'])],
-            ['Sale Price:', f"${float(sale['sale_price']):,.2f}"],
-            ['Sale Date:', sale['sale_date']],
-            ['Buyer Info:', sale['buyer_info'] or 'Not provided'],
-        ]
-
-        sale_table = Table(sale_data, colWidths=[1.5*inch, 4*inch])
-        sale_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        story.append(sale_table)
-        story.append(Spacer(1, 20))
-
-        # Sale Notes if available
-        if sale.get('sale_notes'):
-            story.append(Paragraph("<b>SALE NOTES</b>", styles['Heading2']))
-            story.append(Paragraph(sale['sale_notes'], styles['Normal']))
-            story.append(Spacer(1, 20))
-
-        # Vehicle Expenses
-        if vehicle_expenses:
-            story.append(Paragraph("<b>VEHICLE EXPENSES</b>", styles['Heading2']))
-
-            expense_data = [['Date', 'Type', 'Description', 'Amount']]
-            total_expenses = 0
-
-            for expense in vehicle_expenses:
-                expense_data.append([
-                    expense['date'],
-                    expense['type'],
-                    expense['description'] or 'N/A',
-                    f"${float(expense['amount']):,.2f}"
-                ])
-                total_expenses += float(expense['amount'])
-
-            # Add total row
-            expense_data.append(['', '', 'TOTAL EXPENSES:', f"${total_expenses:,.2f}"])
-
-            expense_table = Table(expense_data, colWidths=[1*inch, 1.5*inch, 2.5*inch, 1*inch])
-            expense_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('ALIGN', (2, 1), (2, -2), 'LEFT'),  # Description column left aligned
-                ('ALIGN', (3, 0), (3, -1), 'RIGHT'), # Amount column right aligned
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('BACKGROUND', (-2, -1), (-1, -1), colors.lightgrey),
-                ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
-            ]))
-            story.append(expense_table)
-            story.append(Spacer(1, 20))
-
-        # Financial Summary
-        story.append(Paragraph("<b>FINANCIAL SUMMARY</b>", styles['Heading2']))
-        purchase_price = float(vehicle['price'])
-        sale_price = float(sale['sale_price'])
-        total_expenses = sum(float(e['amount']) for e in vehicle_expenses)
-        gross_profit = sale_price - purchase_price
-        net_profit = gross_profit - total_expenses
-
-        financial_data = [
-            ['Purchase Price:', f"${purchase_price:,.2f}"],
-            ['Sale Price:', f"${sale_price:,.2f}"],
-            ['Gross Profit:', f"${gross_profit:,.2f}"],
-            ['Total Expenses:', f"${total_expenses:,.2f}"],
-            ['Net Profit:', f"${net_profit:,.2f}"]
-        ]
-
-        financial_table = Table(financial_data, colWidths=[2*inch, 1.5*inch])
-        financial_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('LINEBELOW', (-2, -1), (-1, -1), 2, colors.black),
-            ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
-        ]))
-        story.append(financial_table)
-        story.append(Spacer(1, 30))
-
-        # Footer
-        story.append(Paragraph(f"Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", styles['Normal']))
-
-        # Build PDF
-        doc.build(story)
-
         # Return PDF
-        buffer.seek(0)
         filename = f"bill_of_sale_{vehicle['make']}_{vehicle['model']}_{vehicle['year']}_sale_{sale_id}.pdf"
 
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/pdf'
-        )
+        return pdf_response(pdf, filename)
 
     except Exception as e:
         logging.error(f"Error generating bill of sale: {e}")
@@ -985,9 +1098,16 @@ def generate_bill_of_sale(sale_id):
 @app.route('/api/vehicle/<int:vehicle_id>')
 def get_vehicle_api(vehicle_id):
     """API endpoint to get vehicle details"""
+    version = data_manager.version
+    cached = _vehicle_json_cache.get(vehicle_id)
+    if cached and cached[0] == version:
+        return app.response_class(cached[1], mimetype='application/json')
+
     vehicle = data_manager.get_vehicle_by_id(vehicle_id)
     if vehicle:
-        return jsonify(vehicle)
+        body = dump_json({field: vehicle[field] for field in VEHICLE_FIELDS})
+        _vehicle_json_cache[vehicle_id] = (version, body)
+        return app.response_class(body, mimetype='application/json')
     return jsonify({'error': 'Vehicle not found'}), 404
 
 @app.route('/vehicle/<int:vehicle_id>/bill_of_sale/download')
@@ -999,13 +1119,10 @@ def download_bill_of_sale(vehicle_id):
             flash('Vehicle not found', 'error')
             return redirect(url_for('inventory'))
 
-        if not data_manager.has_bill_of_sale(vehicle_id):
-            flash('No bill of sale found for this vehicle', 'error')
-            return redirect(url_for('inventory'))
-
+        # A missing file comes back empty, so no separate existence check is needed
         file_data = data_manager.get_bill_of_sale(vehicle_id)
         if not file_data:
-            flash('Error retrieving bill of sale', 'error')
+            flash('No bill of sale found for this vehicle', 'error')
             return redirect(url_for('inventory'))
 
         # Get original filename from vehicle record
@@ -1013,12 +1130,8 @@ def download_bill_of_sale(vehicle_id):
         if not original_filename:
             original_filename = f"bill_of_sale_vehicle_{vehicle_id}.pdf"
 
-        # Determine content type
-        content_type = 'application/pdf'
-        if original_filename.lower().endswith(('.jpg', '.jpeg')):
-            content_type = 'image/jpeg'
-        elif original_filename.lower().endswith('.png'):
-            content_type = 'image/png'
+        # Determine content type from the extension, defaulting to PDF
+        content_type = classify_upload(original_filename) or 'application/pdf'
 
         return send_file(
             io.BytesIO(file_data),
@@ -1047,4 +1160,5 @@ def delete_vehicle_bill_of_sale(vehicle_id):
     return redirect(url_for('edit_vehicle', vehicle_id=vehicle_id))
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Development server only; see wsgi.py for production
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""WSGI entry point for running the app under a production server, e.g.
+
+    gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:5000 wsgi:app
+
+DataManager is shared by the threads of a worker. CSV writes are only
+serialized within one process, so scale with threads rather than workers.
+Running this file directly serves the app with waitress when it is installed.
+"""
+from main import app
+
+if __name__ == '__main__':
+    try:
+        from waitress import serve
+    except ImportError:
+        app.run(host='0.0.0.0', port=5000, threaded=True)
+    else:
+        serve(app, host='0.0.0.0', port=5000, threads=16)